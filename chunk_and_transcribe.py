@@ -1,9 +1,19 @@
-import requests
-import base64
+import asyncio
+import atexit
+import httpx
+import io
+import logging
+import multiprocessing
+import numpy as np
 import os
-import json
-import stat
-from pydub import AudioSegment
+import queue
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from glob import glob
+from logging.handlers import QueueHandler, QueueListener
+import orjson
+import pybase64
+import soundfile as sf
 from datetime import datetime
 from dotenv import load_dotenv
 load_dotenv(verbose=True)
@@ -11,131 +21,239 @@ load_dotenv(verbose=True)
 # Set up machine and get the credentials from https://huggingface.co/openai/whisper-large-v3-turbo -> HF Inference
 # FLAC files should be in the "audio" folder
 
-def query(payload):
+_HEAVY_RULE = "=" * 80
+_LIGHT_RULE = "-" * 80
+
+# Per-chunk progress goes through a queue to one background writer thread,
+# so workers never block on (or contend for) the stdout lock. The chunking
+# executor uses the spawn start method so each worker process re-imports
+# this module and gets its own queue and listener; under fork the inherited
+# listener thread would not survive and worker logs would vanish.
+_LOG_QUEUE = queue.SimpleQueue()
+_LOG_LISTENER = QueueListener(_LOG_QUEUE, logging.StreamHandler(sys.stdout))
+_LOG_LISTENER.start()
+atexit.register(_LOG_LISTENER.stop)
+logger = logging.getLogger("chunk_and_transcribe")
+logger.setLevel(logging.INFO)
+logger.addHandler(QueueHandler(_LOG_QUEUE))
+
+# Resolved once at import; query runs once per chunk on the hot path
+_HF_URL = os.getenv("HF_INFERENCE_ENDPOINT")
+_HEADERS = {
+    "Accept": "application/json",
+    "Authorization": "Bearer " + str(os.getenv("HF_TOKEN")),
+    "Content-Type": "application/json"
+}
+
+async def query(client, payload):
     """Send audio chunk to Whisper LLM endpoint"""
-    headers = {
-        "Accept": "application/json",
-        "Authorization": "Bearer " + str(os.getenv("HF_TOKEN")),
-        "Content-Type": "application/json"
-    }
-    response = requests.post(
-        os.getenv("HF_INFERENCE_ENDPOINT"),
-        headers=headers,
-        json=payload
+    # Serialize with orjson rather than letting httpx run the megabyte
+    # base64 string through stdlib json
+    response = await client.post(
+        _HF_URL,
+        headers=_HEADERS,
+        content=orjson.dumps(payload)
     )
     return response.json()
 
-def chunk_flac_audio(input_file, output_folder, chunk_length_s=20):
-    """Chunk a FLAC file into segments"""
-    print(f"Loading {input_file}...")
-    audio = AudioSegment.from_file(input_file, format="flac")
-
-    # Calculate details (pydub works in milliseconds)
-    chunk_length_ms = chunk_length_s * 1000
-    total_length_ms = len(audio)
+def _load_cached_chunks(cache_folder, source_mtime, chunk_length_s):
+    """Return cached (name, flac_bytes, duration_s) tuples, or None if the cache is stale"""
+    manifest_path = os.path.join(cache_folder, ".manifest.json")
+    if not os.path.exists(manifest_path):
+        return None
 
-    # Calculate number of chunks
-    num_chunks = (total_length_ms // chunk_length_ms) + (1 if total_length_ms % chunk_length_ms != 0 else 0)
+    try:
+        with open(manifest_path, "rb") as f:
+            manifest = orjson.loads(f.read())
+    except (OSError, orjson.JSONDecodeError):
+        return None
 
-    print(f"Total duration: {total_length_ms/1000:.2f} seconds")
-    print(f"Generating {num_chunks} chunks...")
+    if manifest.get("source_mtime") != source_mtime or manifest.get("chunk_length_s") != chunk_length_s:
+        return None
 
-    # Create output folder if it doesn't exist
-    if not os.path.exists(output_folder):
-        os.makedirs(output_folder)
+    cached_files = sorted(glob(os.path.join(cache_folder, "*_chunk_*.flac")))
+    if len(cached_files) != manifest.get("count"):
+        return None
 
     chunks = []
-    # Slice and save
-    for i in range(num_chunks):
-        start_time = i * chunk_length_ms
-        end_time = (i + 1) * chunk_length_ms
+    for path in cached_files:
+        with open(path, "rb") as f:
+            chunks.append((os.path.basename(path), f.read(), sf.info(path).duration))
+    return chunks
 
-        chunk = audio[start_time:end_time]
+def chunk_flac_audio(input_file, cache_folder, chunk_length_s=30):
+    """Chunk a FLAC file into in-memory segments as (name, flac_bytes, duration_s) tuples"""
+    # Reuse chunks from a previous run when the source hasn't changed
+    source_mtime = os.stat(input_file).st_mtime
+    cached = _load_cached_chunks(cache_folder, source_mtime, chunk_length_s)
+    if cached is not None:
+        logger.info("Reusing %d cached chunks for %s.\n", len(cached), input_file)
+        return cached
 
-        # Format filename (e.g., chunk_001.flac)
-        output_filename = os.path.join(output_folder, f"chunk_{i+1:03d}.flac")
+    logger.info("Loading %s...", input_file)
+    base_name = os.path.splitext(os.path.basename(input_file))[0]
 
-        # Export the chunk
-        chunk.export(output_filename, format="flac")
-        print(f"Exported: {output_filename}")
-        chunks.append(output_filename)
+    if not os.path.exists(cache_folder):
+        os.makedirs(cache_folder)
+    else:
+        # Clear stale chunks from previous runs; leftovers from a longer
+        # chunk set would make the file count disagree with the new
+        # manifest and invalidate the cache on every later run
+        for stale in glob(os.path.join(cache_folder, "*_chunk_*.flac")):
+            os.remove(stale)
 
-    print("Chunking complete.\n")
+    chunks = []
+    with sf.SoundFile(input_file) as audio:
+        samplerate = audio.samplerate
+        total_frames = audio.frames
+
+        # Calculate number of chunks (soundfile works in frames)
+        chunk_frames = chunk_length_s * samplerate
+        num_chunks = (total_frames // chunk_frames) + (1 if total_frames % chunk_frames != 0 else 0)
+
+        logger.info("Total duration: %.2f seconds", total_frames / samplerate)
+        logger.info("Generating %d chunks...", num_chunks)
+
+        # Slice frame ranges directly and encode to FLAC in memory,
+        # no full decode and no disk round-trip per chunk. One scratch
+        # buffer and one BytesIO are reused for every chunk instead of
+        # allocating per chunk.
+        scratch = np.empty((chunk_frames, audio.channels), dtype='int16')
+        buf = io.BytesIO()
+        for i in range(num_chunks):
+            audio.seek(i * chunk_frames)
+            data = audio.read(chunk_frames, dtype='int16', out=scratch)
+
+            # Format chunk name (e.g., recording_chunk_001.flac)
+            chunk_name = f"{base_name}_chunk_{i+1:03d}.flac"
+
+            buf.seek(0)
+            buf.truncate()
+            sf.write(buf, data, samplerate, format='FLAC', subtype='PCM_16')
+            flac_bytes = buf.getvalue()
+
+            # Persist to the cache so unchanged sources skip re-chunking next run
+            with open(os.path.join(cache_folder, chunk_name), "wb") as f:
+                f.write(flac_bytes)
+
+            logger.info("Encoded: %s", chunk_name)
+            chunks.append((chunk_name, flac_bytes, len(data) / samplerate))
+
+    manifest = {
+        "source_mtime": source_mtime,
+        "chunk_length_s": chunk_length_s,
+        "count": len(chunks),
+    }
+    with open(os.path.join(cache_folder, ".manifest.json"), "wb") as f:
+        f.write(orjson.dumps(manifest))
+
+    logger.info("Chunking complete.\n")
     return chunks
 
-def process_chunks_with_whisper(chunk_files, output_text_file):
-    """Process all chunks through Whisper LLM and save results"""
-    results = []
+def _chunk_one(args):
+    """Worker-process wrapper so chunk_flac_audio can run under ProcessPoolExecutor"""
+    input_file, cache_folder, chunk_length_s = args
+    return chunk_flac_audio(input_file, cache_folder, chunk_length_s)
+
+async def _encode_chunks(chunks, chunk_queue, num_workers):
+    """Producer: base64-encode chunks and feed the transcription workers"""
+    for chunk_name, chunk_bytes in chunks:
+        # Encode off the event loop; pybase64 uses libbase64's SIMD path
+        # and skips the bytes->str copy of b64encode().decode()
+        base_64_str = await asyncio.to_thread(pybase64.b64encode_as_string, chunk_bytes)
+        await chunk_queue.put((chunk_name, base_64_str))
+
+    # One sentinel per worker so they all shut down
+    for _ in range(num_workers):
+        await chunk_queue.put(None)
+
+def _format_result(result):
+    """Format one transcription result as a single report record"""
+    if "error" in result:
+        body = f"ERROR: {result['error']}\n"
+    else:
+        body = orjson.dumps(result["transcription"], option=orjson.OPT_INDENT_2).decode()
+    return f"Chunk: {result['chunk_file']}\n{_LIGHT_RULE}\n{body}\n\n"
 
-    print("Starting transcription of chunks...\n")
+async def _transcribe_worker(client, chunk_queue, out_file):
+    """Consumer: pull encoded chunks off the queue, POST them, and record the result"""
+    while True:
+        item = await chunk_queue.get()
+        if item is None:
+            return
+        chunk_name, base_64_str = item
 
-    for chunk_file in chunk_files:
         try:
-            print(f"Processing chunk: {os.path.basename(chunk_file)}")
-
-            # Read chunk file and encode to base64
-            with open(chunk_file, "rb") as f:
-                base_64_encoded = base64.b64encode(f.read())
-                base_64_str = base_64_encoded.decode('utf-8')
+            logger.info("Processing chunk: %s", chunk_name)
 
             # Query Whisper API
-            output = query({
+            output = await query(client, {
                 "inputs": base_64_str,
                 "parameters": {}
             })
 
-            print(f"Successfully converted {os.path.basename(chunk_file)} to text.")
-            results.append({
-                "chunk_file": os.path.basename(chunk_file),
+            logger.info("Successfully converted %s to text.", chunk_name)
+            result = {
+                "chunk_file": chunk_name,
                 "transcription": output
-            })
+            }
 
         except Exception as e:
-            print(f"Error processing {chunk_file}: {str(e)}")
-            results.append({
-                "chunk_file": os.path.basename(chunk_file),
+            logger.info("Error processing %s: %s", chunk_name, str(e))
+            result = {
+                "chunk_file": chunk_name,
                 "error": str(e)
-            })
-
-    print(f"\nTranscription complete. Writing results to {output_text_file}...\n")
-
-    # Write results to text file
-    with open(output_text_file, "w") as f:
-        f.write(f"Whisper LLM Transcription Results\n")
-        f.write(f"Generated: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
-        f.write("=" * 80 + "\n\n")
-
-        for result in results:
-            chunk_name = result["chunk_file"]
-            f.write(f"Chunk: {chunk_name}\n")
-            f.write("-" * 80 + "\n")
-
-            if "error" in result:
-                f.write(f"ERROR: {result['error']}\n")
-            else:
-                f.write(json.dumps(result["transcription"], ensure_ascii=False, indent=2))
-
-            f.write("\n\n")
-
-    # Set file permissions to read-only
-    set_readonly(output_text_file)
-
-    print(f"Results saved to {output_text_file}")
+            }
+
+        # Append the record as soon as its request finishes, so a crash
+        # mid-run keeps every transcription already completed. Workers all
+        # run on the event loop, so no write lock is needed.
+        out_file.write(_format_result(result))
+        out_file.flush()
+
+async def process_chunks_with_whisper(chunks, output_text_file, concurrency=8):
+    """Process all chunks through Whisper LLM in parallel, streaming results to disk"""
+    print(f"Starting transcription of chunks, writing results to {output_text_file} as they complete...\n")
+
+    # Two-stage pipeline: a producer encodes chunks while consumers wait on
+    # the network, so encode cost hides inside the previous request's RTT.
+    # The bounded queue keeps at most `concurrency` encoded payloads in RAM.
+    chunk_queue = asyncio.Queue(maxsize=concurrency)
+
+    with open(output_text_file, "w", buffering=1 << 20) as f:
+        f.write(
+            "Whisper LLM Transcription Results\n"
+            f"Generated: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n"
+            f"{_HEAVY_RULE}\n\n"
+        )
+        f.flush()
+
+        # One HTTP/2 connection carries all in-flight requests as multiplexed
+        # streams, so TLS and TCP setup happen once instead of once per chunk
+        async with httpx.AsyncClient(
+            http2=True,
+            limits=httpx.Limits(max_connections=1, max_keepalive_connections=1),
+            timeout=120,
+        ) as client:
+            workers = [
+                asyncio.create_task(_transcribe_worker(client, chunk_queue, f))
+                for _ in range(concurrency)
+            ]
+            await asyncio.gather(_encode_chunks(chunks, chunk_queue, concurrency), *workers)
+
+        # Set to read-only (r--r--r--) on the open descriptor, saving the
+        # stat + path re-resolution of a chmod after close
+        os.fchmod(f.fileno(), 0o444)
+
+    print(f"\nTranscription complete. Results saved to {output_text_file}")
     print(f"File permissions set to read-only.\n")
 
-def set_readonly(filepath):
-    """Set file to read-only (user can read, but cannot write)"""
-    # Get current permissions
-    current_perms = os.stat(filepath).st_mode
-    # Set to read-only for owner (r--r--r--)
-    os.chmod(filepath, stat.S_IRUSR | stat.S_IRGRP | stat.S_IROTH)
-
 def main():
     # Configuration
     audio_folder = "audio"
     chunks_folder = "chunks"
     output_text_file = "transcription_results.txt"
-    chunk_length = 20  # seconds
+    chunk_length = 30  # seconds, matches Whisper's native 30 s window
 
     # Find all FLAC files in audio folder
     if not os.path.exists(audio_folder):
@@ -152,26 +270,35 @@ def main():
 
     all_chunks = []
 
-    # Process each FLAC file
-    for flac_file in flac_files:
-        input_path = os.path.join(audio_folder, flac_file)
-        file_chunks_folder = os.path.join(chunks_folder, os.path.splitext(flac_file)[0])
-
-        print(f"\n{'='*80}")
-        print(f"Processing: {flac_file}")
-        print(f"{'='*80}\n")
-
-        # Chunk the audio file
-        chunks = chunk_flac_audio(input_path, file_chunks_folder, chunk_length)
-        all_chunks.extend(chunks)
+    # Chunk the files in parallel worker processes; each file's
+    # decode/encode is independent CPU work on the libsndfile C path.
+    # Spawn (not fork) so each worker re-imports the module and gets a
+    # live queued-logging listener; see the logging setup above.
+    jobs = [
+        (
+            os.path.join(audio_folder, flac_file),
+            os.path.join(chunks_folder, os.path.splitext(flac_file)[0]),
+            chunk_length,
+        )
+        for flac_file in flac_files
+    ]
+    with ProcessPoolExecutor(
+        max_workers=min(os.cpu_count(), len(flac_files)),
+        mp_context=multiprocessing.get_context("spawn"),
+    ) as ex:
+        for chunks in ex.map(_chunk_one, jobs):
+            all_chunks.extend(chunks)
 
     # Process all chunks through Whisper
     if all_chunks:
-        process_chunks_with_whisper(all_chunks, output_text_file)
+        # Dispatch longest chunks first so the short tail chunks (which the
+        # endpoint pads to a full window anyway) don't occupy early slots
+        all_chunks.sort(key=lambda chunk: chunk[2], reverse=True)
+        chunk_payloads = [(name, flac_bytes) for name, flac_bytes, _ in all_chunks]
+        asyncio.run(process_chunks_with_whisper(chunk_payloads, output_text_file))
         print("All processing complete!")
     else:
         print("No chunks were created.")
 
 if __name__ == "__main__":
     main()
-
@@ -40,16 +40,17 @@ def list_audio_files(audio_folder="audio"):
         print(f"{audio_folder} folder not found.")
         return
 
-    flac_files = [f for f in os.listdir(audio_folder) if f.lower().endswith(".flac")]
+    # scandir entries carry size info from the directory read, so no
+    # extra stat per file
+    entries = [e for e in os.scandir(audio_folder) if e.name.lower().endswith(".flac")]
 
-    if not flac_files:
+    if not entries:
         print(f"No FLAC files in {audio_folder}")
     else:
-        print(f"Found {len(flac_files)} FLAC file(s):")
-        for f in flac_files:
-            file_path = os.path.join(audio_folder, f)
-            size_mb = os.path.getsize(file_path) / (1024 * 1024)
-            print(f"  - {f} ({size_mb:.2f} MB)")
+        print(f"Found {len(entries)} FLAC file(s):")
+        for e in entries:
+            size_mb = e.stat().st_size / (1024 * 1024)
+            print(f"  - {e.name} ({size_mb:.2f} MB)")
 
 def list_chunks(chunks_folder="chunks"):
     """List generated chunks"""
@@ -1,41 +1,62 @@
 import requests
-import base64
+import mmap
 import os
 import json
+import pybase64
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter, Retry
 
 # Set up machine and get the credentials from https://huggingface.co/openai/whisper-large-v3-turbo -> HF Inference
 # change audio format to .flac before running the script, and put the files in the "audio" folder
 
+# Resolved once at import instead of per request; the shared session keeps
+# connections alive so each call skips the TCP/TLS handshake
+_HF_URL = os.getenv("HF_INFERENCE_ENDPOINT")
+_HEADERS = {
+ "Accept" : "application/json",
+ "Authorization": "Bearer " + str(os.getenv("HF_TOKEN")),
+ "Content-Type": "application/json"
+}
+_SESSION = requests.Session()
+_SESSION.mount("https://", HTTPAdapter(
+ pool_connections=16,
+ pool_maxsize=16,
+ max_retries=Retry(total=3, backoff_factor=0.5)
+))
+
 def query(payload):
- headers = {
-  "Accept" : "application/json",
-  "Authorization": "Bearer " + str(os.getenv("HF_TOKEN")),
-  "Content-Type": "application/json"
- }
- response = requests.post(
-  os.getenv("HF_INFERENCE_ENDPOINT"),
-  headers=headers,
-  json=payload
+ response = _SESSION.post(
+  _HF_URL,
+  headers=_HEADERS,
+  json=payload,
+  timeout=120
  )
  return response.json()
 
 folder = "audio"
 flac_files = [f for f in os.listdir(folder) if f.lower().endswith(".flac")]
 
-results = []
-for fname in flac_files:
+def transcribe_one(fname):
     print(f"Processing file: {fname}")
     path = os.path.join(folder, fname)
+    # mmap hands pybase64 the file pages directly, skipping the read() copy
     with open(path, "rb") as f:
-        base_64_encoded = base64.b64encode(f.read())
-        base_64_str = base_64_encoded.decode('utf-8')
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            base_64_str = pybase64.b64encode_as_string(mm)
 
     output = query({
      "inputs": base_64_str,
      "parameters": {}
     })
     print(f"Successfully converted {fname} to text.")
-    results.append((fname, output))
+    return (fname, output)
+
+# Requests are network-bound, so a thread pool over the shared session
+# overlaps them instead of paying one full round-trip per file
+results = []
+if flac_files:
+    with ThreadPoolExecutor(max_workers=min(16, len(flac_files))) as ex:
+        results = list(ex.map(transcribe_one, flac_files))
 
 # Print results in Markdown format
 for fname, output in results:
@@ -4,6 +4,7 @@ Setup and validation script for the chunk-and-transcribe project
 """
 
 import os
+import shutil
 import sys
 import subprocess
 from pathlib import Path
@@ -18,34 +19,28 @@ def check_python_version():
 
 def check_ffmpeg():
     """Check if FFmpeg is installed"""
-    # Try standard path first
-    try:
-        result = subprocess.run(['ffmpeg', '-version'], capture_output=True, text=True)
-        if result.returncode == 0:
-            print("✅ FFmpeg is installed")
-            return True
-    except FileNotFoundError:
-        pass
-
-    # Try Homebrew ARM64 path (Apple Silicon)
-    try:
-        result = subprocess.run(['/opt/homebrew/bin/ffmpeg', '-version'], capture_output=True, text=True)
-        if result.returncode == 0:
-            print("✅ FFmpeg is installed (found at /opt/homebrew/bin/ffmpeg)")
-            print("   ℹ️  Add to PATH: export PATH=\"/opt/homebrew/bin:$PATH\"")
-            return True
-    except FileNotFoundError:
-        pass
-
-    # Try Homebrew Intel path
-    try:
-        result = subprocess.run(['/usr/local/bin/ffmpeg', '-version'], capture_output=True, text=True)
-        if result.returncode == 0:
-            print("✅ FFmpeg is installed (found at /usr/local/bin/ffmpeg)")
-            print("   ℹ️  Add to PATH: export PATH=\"/usr/local/bin:$PATH\"")
+    # Locate the binary with stat-only which() lookups instead of
+    # spawning an ffmpeg subprocess per candidate path
+    found = shutil.which('ffmpeg')
+    homebrew = None
+    if not found:
+        # Homebrew paths (Apple Silicon, then Intel) that may not be on PATH
+        homebrew = shutil.which('ffmpeg', path='/opt/homebrew/bin:/usr/local/bin')
+        found = homebrew
+
+    if found:
+        # Verify the found binary actually runs
+        try:
+            result = subprocess.run([found, '-version'], capture_output=True, text=True)
+        except FileNotFoundError:
+            result = None
+        if result is not None and result.returncode == 0:
+            if homebrew:
+                print(f"✅ FFmpeg is installed (found at {found})")
+                print(f"   ℹ️  Add to PATH: export PATH=\"{os.path.dirname(found)}:$PATH\"")
+            else:
+                print("✅ FFmpeg is installed")
             return True
-    except FileNotFoundError:
-        pass
 
     print("❌ FFmpeg not found in system PATH")
     print("   Install FFmpeg:")
@@ -60,7 +55,8 @@ def check_ffmpeg():
 
 def check_required_packages():
     """Check if required Python packages are installed"""
-    required = ['requests', 'pydub', 'dotenv']
+    # h2 backs httpx's http2=True client and is only pulled in by httpx[http2]
+    required = ['requests', 'soundfile', 'dotenv', 'httpx', 'h2', 'orjson', 'pybase64']
     missing = []
 
     for package in required:
@@ -126,17 +122,19 @@ def check_audio_files():
         print("❌ audio/ folder not found")
         return False
 
-    flac_files = [f for f in os.listdir('audio') if f.lower().endswith('.flac')]
+    # scandir entries carry size info from the directory read, so no
+    # extra stat per file
+    entries = [e for e in os.scandir('audio') if e.name.lower().endswith('.flac')]
 
-    if not flac_files:
+    if not entries:
         print("⚠️  No FLAC files in audio/ folder")
         print("   Add .flac files to the audio/ folder before running the script")
         return False
 
-    print(f"✅ Found {len(flac_files)} FLAC file(s) in audio/ folder")
-    for f in flac_files:
-        size_mb = os.path.getsize(os.path.join('audio', f)) / (1024 * 1024)
-        print(f"   - {f} ({size_mb:.2f} MB)")
+    print(f"✅ Found {len(entries)} FLAC file(s) in audio/ folder")
+    for e in entries:
+        size_mb = e.stat().st_size / (1024 * 1024)
+        print(f"   - {e.name} ({size_mb:.2f} MB)")
 
     return True
 